@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.8"
+# dependencies = []
+# ///
+"""
+Detect drift between two header stats snapshots against the static header table.
+
+Inputs:
+  - stats snapshots: JSON arrays (plugin export, server /stats) or the server's
+    aggregated stats.json object. Several files per side are summed.
+  - static-header-table.json (output of generate_outputs.py)
+
+Reports, per request/response and complete_pair/name_only:
+  - rank changes of the current table slots between the snapshots
+  - challengers that would displace current slots on the new snapshot
+  - the estimated byte-savings delta of regenerating the table
+
+Usage:
+  uv run table_drift.py --old stats-old.json --new stats-new.json
+  uv run table_drift.py --old a.json b.json --new c.json --table static-header-table.json --check
+"""
+
+import argparse
+import heapq
+import json
+import sys
+from bisect import bisect_right
+from collections import defaultdict
+from itertools import zip_longest
+from operator import itemgetter
+
+HEADER_TYPES = ("request", "response")
+KINDS = ("complete_pair", "name_only")
+ANONYMIZED = "(anonymized)"
+
+
+def varint_len(n):
+    """Number of bytes needed to encode n as an unsigned varint."""
+    size = 1
+    while n >= 0x80:
+        n >>= 7
+        size += 1
+    return size
+
+
+def literal_size(name, value):
+    """Estimated bytes for a header sent without a static table entry."""
+    name_len = len(name.encode("utf-8"))
+    value_len = len(value.encode("utf-8"))
+    if name_len < 0x80 and value_len < 0x80:
+        return name_len + value_len + 2
+    return varint_len(name_len) + name_len + varint_len(value_len) + value_len
+
+
+def pair_saving(name, value):
+    """Bytes saved per occurrence by a complete pair slot (Format 1, one byte)."""
+    return literal_size(name, value) - 1
+
+
+def name_saving(name):
+    """Bytes saved per occurrence by a name-only slot (Format 2, ID + value)."""
+    name_len = len(name.encode("utf-8"))
+    return varint_len(name_len) + name_len - 1
+
+
+def make_key(header_type, kind, name, value=""):
+    """Flat "type::kind::name::value" key, sorts and compares faster than tuples."""
+    return f"{header_type}::{kind}::{name}::{value}"
+
+
+def split_key(key):
+    """Split a key back into (type, kind, name, value); values may contain '::'."""
+    return key.split("::", 3)
+
+
+def load_snapshot(paths):
+    """Load and sum stats files into {"type::kind::name::value": count}."""
+    counts = defaultdict(int)
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            print(f"Error: The file '{path}' was not found.", file=sys.stderr)
+            sys.exit(1)
+        except json.JSONDecodeError as e:
+            print(f"Error: Could not decode JSON from '{path}': {e}", file=sys.stderr)
+            sys.exit(1)
+
+        # Server stats.json is an object keyed by "type::name::value"
+        entries = data.values() if isinstance(data, dict) else data
+        for entry in entries:
+            try:
+                header_type = entry["type"]
+                name = entry["name"].lower()
+                value = entry.get("value") or ""
+                count = int(entry["count"])
+            except (KeyError, TypeError, AttributeError, ValueError):
+                print(
+                    f"Warning: Skipping malformed entry in '{path}': {entry}",
+                    file=sys.stderr,
+                )
+                continue
+            if header_type not in HEADER_TYPES:
+                continue
+
+            # (anonymized) values are name-only, same as merge_headers.py. A missing
+            # value counts as an empty-value pair (shown as `name: ""`)
+            counts[make_key(header_type, "name_only", name)] += count
+            if value != ANONYMIZED:
+                counts[make_key(header_type, "complete_pair", name, value)] += count
+    return counts
+
+
+def load_table(table_file):
+    """Load the current static table into {"type::kind::name::value": header id}."""
+    try:
+        with open(table_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        print(f"Error: The file '{table_file}' was not found.", file=sys.stderr)
+        sys.exit(1)
+    except json.JSONDecodeError as e:
+        print(f"Error: Could not decode JSON from '{table_file}': {e}", file=sys.stderr)
+        sys.exit(1)
+
+    slots = {}
+    for header_type in HEADER_TYPES:
+        for header in data.get(f"{header_type}_headers", {}).get("headers", []):
+            kind = header["type"]
+            value = header.get("value", "") if kind == "complete_pair" else ""
+            slots[make_key(header_type, kind, header["name"].lower(), value)] = header[
+                "id"
+            ]
+    return slots
+
+
+def merge_counts(old, new):
+    """Single sort-merge pass over both snapshots, yielding (key, old, new)."""
+    old_keys = sorted(old)
+    new_keys = sorted(new)
+    old_len, new_len = len(old_keys), len(new_keys)
+    i = j = 0
+    while i < old_len and j < new_len:
+        old_key = old_keys[i]
+        new_key = new_keys[j]
+        if old_key == new_key:
+            yield old_key, old[old_key], new[new_key]
+            i += 1
+            j += 1
+        elif old_key < new_key:
+            yield old_key, old[old_key], 0
+            i += 1
+        else:
+            yield new_key, 0, new[new_key]
+            j += 1
+    for key in old_keys[i:]:
+        yield key, old[key], 0
+    for key in new_keys[j:]:
+        yield key, 0, new[key]
+
+
+class SlotRanks:
+    """Ranks of the table slots in one category, counted during the merge pass.
+
+    A slot's rank is one plus the number of candidates that beat it, ordered
+    by savings (descending) and then key, so no candidate list is sorted.
+    """
+
+    def __init__(self, slot_savings):
+        # Slots with no savings on this snapshot are unranked
+        self.order = sorted(
+            (-savings, key) for key, savings in slot_savings.items() if savings > 0
+        )
+        # Candidates saving less than the weakest slot cannot beat any slot
+        self.worst = -self.order[-1][0] if self.order else float("inf")
+        self.beaten = [0] * (len(self.order) + 1)
+
+    def add(self, key, savings):
+        # Every slot from this index on ranks below the candidate
+        self.beaten[bisect_right(self.order, (-savings, key))] += 1
+
+    def ranks(self):
+        ranks = {}
+        beaten = 0
+        for i, (_, key) in enumerate(self.order):
+            beaten += self.beaten[i]
+            ranks[key] = beaten + 1
+        return ranks
+
+
+def pair_coverage(counts, selected):
+    """Sum complete pair counts per (type, name) for the selected pair slots."""
+    covered = defaultdict(int)
+    for key in selected:
+        header_type, _, name, _ = split_key(key)
+        covered[(header_type, name)] += counts.get(key, 0)
+    return covered
+
+
+def slot_savings(counts, covered, key):
+    """Estimated savings of one candidate; name-only excludes pair slot hits."""
+    header_type, kind, name, value = split_key(key)
+    if kind == "complete_pair":
+        return counts.get(key, 0) * pair_saving(name, value)
+    remaining = counts.get(key, 0) - covered.get((header_type, name), 0)
+    return max(remaining, 0) * name_saving(name)
+
+
+def analyze(old, new, slots):
+    """Build the drift report for each header type and slot kind."""
+    categories = [(t, k) for t in HEADER_TYPES for k in KINDS]
+    parsed = {key: split_key(key) for key in slots}
+    table = {
+        category: [key for key in slots if tuple(parsed[key][:2]) == category]
+        for category in categories
+    }
+    table_pairs = [key for key in slots if parsed[key][1] == "complete_pair"]
+
+    # Slot savings under the current table are known up front from the slot keys
+    covered = {
+        "old": pair_coverage(old, table_pairs),
+        "new": pair_coverage(new, table_pairs),
+    }
+    savings = {
+        side: {key: slot_savings(counts, covered[side], key) for key in slots}
+        for side, counts in (("old", old), ("new", new))
+    }
+    ranking = {
+        side: {
+            category: SlotRanks({key: savings[side][key] for key in table[category]})
+            for category in categories
+        }
+        for side in ("old", "new")
+    }
+
+    # Single merge pass: count candidates beating each slot, keep new-side candidates
+    pair_candidates = {t: [] for t in HEADER_TYPES}
+    name_candidates = {t: [] for t in HEADER_TYPES}
+    old_ranks, new_ranks = ranking["old"], ranking["new"]
+    for key, old_count, new_count in merge_counts(old, new):
+        header_type, kind, name, value = key.split("::", 3)  # split_key, inlined
+        if kind == "complete_pair":
+            per_hit = pair_saving(name, value)
+            old_savings = old_count * per_hit
+            new_savings = new_count * per_hit
+            if new_count:
+                pair_candidates[header_type].append((new_savings, key))
+        else:
+            per_hit = name_saving(name)
+            old_savings = (
+                max(old_count - covered["old"].get((header_type, name), 0), 0) * per_hit
+            )
+            new_savings = (
+                max(new_count - covered["new"].get((header_type, name), 0), 0) * per_hit
+            )
+            if new_count:
+                name_candidates[header_type].append((key, name, new_count, per_hit))
+        if old_savings >= old_ranks[(header_type, kind)].worst:
+            old_ranks[(header_type, kind)].add(key, old_savings)
+        if new_savings >= new_ranks[(header_type, kind)].worst:
+            new_ranks[(header_type, kind)].add(key, new_savings)
+
+    report = {}
+    for header_type in HEADER_TYPES:
+        pair_cat = (header_type, "complete_pair")
+        name_cat = (header_type, "name_only")
+
+        # Ideal table on the new snapshot with the same number of slots per kind.
+        # Candidates arrive in key order, so nlargest breaks ties by key.
+        ideal_pairs = heapq.nlargest(
+            len(table[pair_cat]), pair_candidates[header_type], key=itemgetter(0)
+        )
+        ideal_covered = pair_coverage(new, [key for _, key in ideal_pairs])
+        ideal_names = heapq.nlargest(
+            len(table[name_cat]),
+            (
+                (
+                    max(count - ideal_covered.get((header_type, name), 0), 0) * per_hit,
+                    key,
+                )
+                for key, name, count, per_hit in name_candidates[header_type]
+            ),
+            key=itemgetter(0),
+        )
+        ideal = {
+            "complete_pair": ideal_pairs,
+            "name_only": [c for c in ideal_names if c[0] > 0],
+        }
+
+        kinds = {}
+        for kind in KINDS:
+            table_keys = table[(header_type, kind)]
+            old_rank = ranking["old"][(header_type, kind)].ranks()
+            new_rank = ranking["new"][(header_type, kind)].ranks()
+
+            rank_changes = [
+                {
+                    "id": slots[key],
+                    "name": parsed[key][2],
+                    "value": parsed[key][3],
+                    "old_rank": old_rank.get(key),
+                    "new_rank": new_rank.get(key),
+                    "old_savings": savings["old"][key],
+                    "new_savings": savings["new"][key],
+                }
+                for key in sorted(table_keys, key=lambda k: int(slots[k], 16))
+            ]
+
+            table_set = set(table_keys)
+            ideal_set = {key for _, key in ideal[kind]}
+            challengers = [
+                {
+                    "name": split_key(key)[2],
+                    "value": split_key(key)[3],
+                    "rank": i + 1,
+                    "savings": candidate_savings,
+                }
+                for i, (candidate_savings, key) in enumerate(ideal[kind])
+                if key not in table_set
+            ]
+            displaced = [
+                {
+                    "id": slots[key],
+                    "name": parsed[key][2],
+                    "value": parsed[key][3],
+                    "savings": savings["new"][key],
+                }
+                for key in table_keys
+                if key not in ideal_set
+            ]
+            displaced.sort(key=lambda x: x["savings"])
+
+            kinds[kind] = {
+                "slots": len(table_keys),
+                "rank_changes": rank_changes,
+                "challengers": challengers,
+                "displaced": displaced,
+                "old_savings": sum(savings["old"][key] for key in table_keys),
+                "new_savings": sum(savings["new"][key] for key in table_keys),
+                "ideal_savings": sum(
+                    candidate_savings for candidate_savings, _ in ideal[kind]
+                ),
+            }
+        report[header_type] = kinds
+    return report
+
+
+def format_header(name, value, kind):
+    if kind == "name_only":
+        return name
+    # Empty-value pairs are Format 1 slots, not name-only, so make that visible
+    return f"{name}: {value}" if value else f'{name}: ""'
+
+
+def format_rank(rank):
+    return "-" if rank is None else str(rank)
+
+
+def print_report(report, show_all=False, top_n=20):
+    totals = {"old": 0, "new": 0, "ideal": 0}
+
+    for header_type in HEADER_TYPES:
+        print(f"\n## {header_type.capitalize()} Headers")
+        for kind in KINDS:
+            section = report[header_type][kind]
+            totals["old"] += section["old_savings"]
+            totals["new"] += section["new_savings"]
+            totals["ideal"] += section["ideal_savings"]
+            label = "Complete Pairs" if kind == "complete_pair" else "Name Only"
+            print(f"\n### {label} ({section['slots']} slots)")
+
+            changes = [
+                row
+                for row in section["rank_changes"]
+                if row["old_rank"] != row["new_rank"]
+            ]
+            rows = section["rank_changes"] if show_all else changes
+            if show_all:
+                print(f"\nSlots: {len(rows)} ({len(changes)} rank changes)")
+            else:
+                print(f"\nRank changes: {len(changes)}")
+            if rows:
+                print(f"{'ID':>6} {'Old':>7} {'New':>7} {'Saved (new)':>14}  Header")
+                for row in rows:
+                    print(
+                        f"{row['id']:>6} {format_rank(row['old_rank']):>7} "
+                        f"{format_rank(row['new_rank']):>7} {row['new_savings']:>14}  "
+                        f"{format_header(row['name'], row['value'], kind)}"
+                    )
+
+            challengers = section["challengers"]
+            displaced = section["displaced"]
+            print(
+                f"\nChallengers: {len(challengers)}, displaced slots: {len(displaced)}"
+            )
+            # Fewer candidates than slots leaves displaced slots without a challenger
+            pairs = list(zip_longest(challengers, displaced))
+            for challenger, slot in pairs[:top_n]:
+                if challenger:
+                    print(
+                        f"  #{challenger['rank']:<5} +{challenger['savings']:>12} "
+                        f"{format_header(challenger['name'], challenger['value'], kind)}"
+                    )
+                if slot:
+                    print(
+                        f"  {slot['id']:>6} -{slot['savings']:>12} "
+                        f"{format_header(slot['name'], slot['value'], kind)}"
+                    )
+            if len(pairs) > top_n:
+                print(f"  ... {len(pairs) - top_n} more")
+
+            print(
+                f"\nEstimated savings: current table {section['old_savings']} -> "
+                f"{section['new_savings']} bytes, regenerated {section['ideal_savings']} bytes"
+            )
+
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare two stats snapshots against the static header table."
+    )
+    parser.add_argument(
+        "--old", nargs="+", required=True, help="Baseline stats file(s)."
+    )
+    parser.add_argument(
+        "--new", nargs="+", required=True, help="Current stats file(s)."
+    )
+    parser.add_argument(
+        "--table",
+        default="static-header-table.json",
+        help="Static table JSON (default: static-header-table.json).",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.0,
+        help="Minimum gain in percent of current savings to recommend regeneration (default: 1.0).",
+    )
+    parser.add_argument(
+        "--top", type=int, default=20, help="Challengers to list per section."
+    )
+    parser.add_argument(
+        "--all", action="store_true", help="List all slots, not only rank changes."
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Exit with status 3 when regeneration is recommended (2 is used by argparse for usage errors).",
+    )
+    args = parser.parse_args()
+
+    slots = load_table(args.table)
+    old = load_snapshot(args.old)
+    new = load_snapshot(args.new)
+    print(f"Loaded {len(slots)} table slots, {len(old)} old keys, {len(new)} new keys")
+
+    report = analyze(old, new, slots)
+    totals = print_report(report, show_all=args.all, top_n=args.top)
+
+    gain = totals["ideal"] - totals["new"]
+    gain_pct = (
+        100.0 * gain / totals["new"] if totals["new"] else (100.0 if gain else 0.0)
+    )
+    recommended = gain > 0 and gain_pct >= args.threshold
+
+    print("\n## Summary")
+    print(f"  Current table, old snapshot: {totals['old']} bytes saved")
+    print(
+        f"  Current table, new snapshot: {totals['new']} bytes saved ({totals['new'] - totals['old']:+})"
+    )
+    print(f"  Regenerated table, new snapshot: {totals['ideal']} bytes saved")
+    print(f"  Byte-savings delta: {gain:+} bytes ({gain_pct:.2f}%)")
+    print(
+        f"  Regenerate: {'yes' if recommended else 'no'} (threshold {args.threshold}%)"
+    )
+
+    if args.check and recommended:
+        sys.exit(3)
+
+
+if __name__ == "__main__":
+    main()